@@ -1,373 +1,736 @@
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
-from functools import wraps
-import datetime
-import jwt
-import os
-
-app = Flask(__name__)
-
-# =======================
-# CONFIGURAÇÕES BÁSICAS
-# =======================
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(BASE_DIR, "sghss_minimo.db")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# IMPORTANTE:
-# Em produção, troque esta chave por uma mais forte e use variável de ambiente.
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "chave-secreta-dev-mude-isto")
-
-db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
-
-
-# =======================
-# MODELOS (tabelas)
-# =======================
-class User(db.Model):
-    """
-    Usuário do sistema.
-    Representa autenticação e perfil de acesso (ADMIN, PROFISSIONAL, PACIENTE).
-    """
-    __tablename__ = "usuarios"
-
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # ADMIN, PROFISSIONAL, PACIENTE
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "email": self.email,
-            "role": self.role,
-        }
-
-
-class Patient(db.Model):
-    """
-    Paciente do sistema: dados básicos necessários para atendimento.
-    """
-    __tablename__ = "pacientes"
-
-    id = db.Column(db.Integer, primary_key=True)
-    nome = db.Column(db.String(120), nullable=False)
-    cpf = db.Column(db.String(14), unique=True, nullable=False)
-    data_nascimento = db.Column(db.String(10), nullable=True)
-    telefone = db.Column(db.String(20), nullable=True)
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "nome": self.nome,
-            "cpf": self.cpf,
-            "data_nascimento": self.data_nascimento,
-            "telefone": self.telefone,
-        }
-
-
-class Professional(db.Model):
-    """
-    Profissional de saúde: médico, enfermeiro, etc.
-    """
-    __tablename__ = "profissionais"
-
-    id = db.Column(db.Integer, primary_key=True)
-    nome = db.Column(db.String(120), nullable=False)
-    especialidade = db.Column(db.String(80), nullable=True)
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "nome": self.nome,
-            "especialidade": self.especialidade,
-        }
-
-
-class Consultation(db.Model):
-    """
-    Consulta entre paciente e profissional.
-    Pode ser presencial ou teleconsulta.
-    """
-    __tablename__ = "consultas"
-
-    id = db.Column(db.Integer, primary_key=True)
-    paciente_id = db.Column(db.Integer, db.ForeignKey("pacientes.id"), nullable=False)
-    profissional_id = db.Column(db.Integer, db.ForeignKey("profissionais.id"), nullable=False)
-    data_hora = db.Column(db.String(25), nullable=False)  # formato ISO string, exemplo: 2025-01-25T14:00:00
-    via = db.Column(db.String(20), nullable=False)  # presencial ou teleconsulta
-    status = db.Column(db.String(20), nullable=False, default="agendada")
-    motivo = db.Column(db.String(255), nullable=True)
-
-    paciente = db.relationship("Patient", backref="consultas")
-    profissional = db.relationship("Professional", backref="consultas")
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "paciente_id": self.paciente_id,
-            "profissional_id": self.profissional_id,
-            "data_hora": self.data_hora,
-            "via": self.via,
-            "status": self.status,
-            "motivo": self.motivo,
-        }
-
-
-# =======================
-# AUTENTICAÇÃO (JWT)
-# =======================
-def create_token(user: User) -> str:
-    """
-    Gera um token JWT com expiração de 2 horas.
-    """
-    payload = {
-        "user_id": user.id,
-        "email": user.email,
-        "role": user.role,
-        "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=2)
-    }
-    token = jwt.encode(payload, app.config["SECRET_KEY"], algorithm="HS256")
-    if isinstance(token, bytes):  # compatibilidade com versões do PyJWT
-        token = token.decode("utf-8")
-    return token
-
-
-def token_required(f):
-    """
-    Decorator para proteger rotas que exigem autenticação.
-    Usa cabeçalho: Authorization: Bearer <token>.
-    """
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get("Authorization", None)
-        if not auth_header:
-            return jsonify({"message": "Token não enviado"}), 401
-
-        parts = auth_header.split()
-        if len(parts) != 2 or parts[0].lower() != "bearer":
-            return jsonify({"message": "Cabeçalho Authorization inválido. Use: Bearer <token>"}), 401
-
-        token = parts[1]
-
-        try:
-            data = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
-            current_user = User.query.get(data["user_id"])
-            if not current_user:
-                return jsonify({"message": "Usuário não encontrado"}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({"message": "Token expirado"}), 401
-        except Exception as e:
-            return jsonify({"message": "Token inválido", "error": str(e)}), 401
-
-        return f(current_user, *args, **kwargs)
-    return decorated
-
-
-# =======================
-# ROTAS DE AUTENTICAÇÃO
-# =======================
-@app.route("/auth/signup", methods=["POST"])
-def signup():
-    """
-    Cria um novo usuário do sistema.
-    Campos: email, password, role (opcional, padrão PACIENTE).
-    """
-    data = request.get_json() or {}
-    email = data.get("email")
-    password = data.get("password")
-    role = data.get("role", "PACIENTE")
-
-    if not email or not password:
-        return jsonify({"message": "email e password são obrigatórios"}), 400
-
-    if User.query.filter_by(email=email).first():
-        return jsonify({"message": "E-mail já cadastrado"}), 400
-
-    pw_hash = bcrypt.generate_password_hash(password).decode("utf-8")
-    user = User(email=email, password_hash=pw_hash, role=role)
-    db.session.add(user)
-    db.session.commit()
-
-    return jsonify({"message": "Usuário criado com sucesso", "user": user.to_dict()}), 201
-
-
-@app.route("/auth/login", methods=["POST"])
-def login():
-    """
-    Realiza login de um usuário e devolve um token JWT.
-    """
-    data = request.get_json() or {}
-    email = data.get("email")
-    password = data.get("password")
-
-    if not email or not password:
-        return jsonify({"message": "email e password são obrigatórios"}), 400
-
-    user = User.query.filter_by(email=email).first()
-    if not user or not bcrypt.check_password_hash(user.password_hash, password):
-        return jsonify({"message": "Credenciais inválidas"}), 401
-
-    token = create_token(user)
-    return jsonify({"access_token": token, "user": user.to_dict()})
-
-
-# =======================
-# ROTAS DE PACIENTES
-# =======================
-@app.route("/pacientes", methods=["POST"])
-@token_required
-def criar_paciente(current_user: User):
-    """
-    Cria um novo paciente.
-    """
-    data = request.get_json() or {}
-    nome = data.get("nome")
-    cpf = data.get("cpf")
-
-    if not nome or not cpf:
-        return jsonify({"message": "nome e cpf são obrigatórios"}), 400
-
-    if Patient.query.filter_by(cpf=cpf).first():
-        return jsonify({"message": "CPF já cadastrado"}), 400
-
-    paciente = Patient(
-        nome=nome,
-        cpf=cpf,
-        data_nascimento=data.get("data_nascimento"),
-        telefone=data.get("telefone"),
-    )
-    db.session.add(paciente)
-    db.session.commit()
-    return jsonify(paciente.to_dict()), 201
-
-
-@app.route("/pacientes", methods=["GET"])
-@token_required
-def listar_pacientes(current_user: User):
-    """
-    Lista todos os pacientes cadastrados.
-    """
-    pacientes = Patient.query.all()
-    return jsonify([p.to_dict() for p in pacientes])
-
-
-@app.route("/pacientes/<int:paciente_id>", methods=["GET"])
-@token_required
-def obter_paciente(current_user: User, paciente_id: int):
-    """
-    Retorna os dados de um paciente específico.
-    """
-    paciente = Patient.query.get_or_404(paciente_id)
-    return jsonify(paciente.to_dict())
-
-
-# =======================
-# ROTAS DE PROFISSIONAIS
-# =======================
-@app.route("/profissionais", methods=["POST"])
-@token_required
-def criar_profissional(current_user: User):
-    """
-    Cria um profissional de saúde.
-    """
-    data = request.get_json() or {}
-    nome = data.get("nome")
-    if not nome:
-        return jsonify({"message": "nome é obrigatório"}), 400
-
-    profissional = Professional(
-        nome=nome,
-        especialidade=data.get("especialidade"),
-    )
-    db.session.add(profissional)
-    db.session.commit()
-    return jsonify(profissional.to_dict()), 201
-
-
-@app.route("/profissionais", methods=["GET"])
-@token_required
-def listar_profissionais(current_user: User):
-    """
-    Lista todos os profissionais de saúde.
-    """
-    profissionais = Professional.query.all()
-    return jsonify([p.to_dict() for p in profissionais])
-
-
-# =======================
-# ROTAS DE CONSULTAS
-# =======================
-@app.route("/consultas", methods=["POST"])
-@token_required
-def criar_consulta(current_user: User):
-    """
-    Cria uma consulta (presencial ou teleconsulta) entre paciente e profissional.
-    """
-    data = request.get_json() or {}
-    paciente_id = data.get("paciente_id")
-    profissional_id = data.get("profissional_id")
-    data_hora = data.get("data_hora")
-    via = data.get("via")  # "presencial" ou "teleconsulta"
-
-    if not (paciente_id and profissional_id and data_hora and via):
-        return jsonify({"message": "paciente_id, profissional_id, data_hora e via são obrigatórios"}), 400
-
-    if via not in ["presencial", "teleconsulta"]:
-        return jsonify({"message": "via deve ser 'presencial' ou 'teleconsulta'"}), 400
-
-    if not Patient.query.get(paciente_id):
-        return jsonify({"message": "Paciente não encontrado"}), 404
-    if not Professional.query.get(profissional_id):
-        return jsonify({"message": "Profissional não encontrado"}), 404
-
-    consulta = Consultation(
-        paciente_id=paciente_id,
-        profissional_id=profissional_id,
-        data_hora=data_hora,
-        via=via,
-        status=data.get("status", "agendada"),
-        motivo=data.get("motivo"),
-    )
-    db.session.add(consulta)
-    db.session.commit()
-    return jsonify(consulta.to_dict()), 201
-
-
-@app.route("/consultas", methods=["GET"])
-@token_required
-def listar_consultas(current_user: User):
-    """
-    Lista consultas; pode filtrar por paciente_id e profissional_id.
-    """
-    paciente_id = request.args.get("paciente_id")
-    profissional_id = request.args.get("profissional_id")
-
-    query = Consultation.query
-    if paciente_id:
-        query = query.filter_by(paciente_id=paciente_id)
-    if profissional_id:
-        query = query.filter_by(profissional_id=profissional_id)
-
-    consultas = query.all()
-    return jsonify([c.to_dict() for c in consultas])
-
-
-# =======================
-# ROTA DE HEALTHCHECK
-# =======================
-@app.route("/health", methods=["GET"])
-def health():
-    """
-    Verifica se a API está respondendo.
-    """
-    return jsonify({"status": "ok", "message": "SGHSS mínimo rodando"}), 200
-
-
-if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-    # debug=True apenas em desenvolvimento; em produção use False.
-    app.run(debug=True)
+from flask import Flask, Response, request, jsonify
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+from cachetools import LRUCache, TTLCache
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntFlag
+from functools import wraps
+import asyncio
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import threading
+import time
+import jwt
+import orjson
+import os
+
+app = Flask(__name__)
+
+# =======================
+# CONFIGURAÇÕES BÁSICAS
+# =======================
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(BASE_DIR, "sghss_minimo.db")
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Pool de conexões dimensionado para workers com threads (gunicorn gthread):
+# várias conexões concorrentes contra o banco em WAL, em vez de serializar
+# tudo em uma só. check_same_thread=False é seguro porque cada conexão do
+# pool é usada por uma thread por vez; timeout=30 absorve locks transitórios
+# de escritores concorrentes.
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "poolclass": QueuePool,
+    "pool_size": 10,
+    "max_overflow": 20,
+    "connect_args": {"check_same_thread": False, "timeout": 30},
+}
+
+# IMPORTANTE:
+# Em produção, troque esta chave por uma mais forte e use variável de ambiente.
+app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "chave-secreta-dev-mude-isto")
+
+db = SQLAlchemy(app)
+
+
+def _persist(obj, commit=True):
+    """
+    Adiciona um objeto à sessão e, por padrão, commita (um fsync).
+    Chamadores em lote passam commit=False e commitam uma única vez no
+    final: um fsync para N inserções em vez de N fsyncs.
+    """
+    db.session.add(obj)
+    if commit:
+        db.session.commit()
+
+
+def ojson(obj, status=200):
+    """
+    Resposta JSON serializada com orjson (2-5x mais rápido que o json da
+    stdlib e saída em bytes sem cópia). Usada nas rotas de listagem, onde
+    o tamanho do payload domina; as demais rotas seguem com jsonify.
+    """
+    return Response(orjson.dumps(obj), status=status, mimetype="application/json")
+
+
+def _table_etag(model) -> str:
+    """
+    ETag fraca e barata para listagens: (max(id), count(id)) muda a cada
+    inserção/remoção e sai de uma query só sobre o índice da PK. Não há
+    rotas de update in-place, então isso cobre todas as mutações atuais.
+    """
+    mx, cnt = db.session.execute(
+        db.select(db.func.max(model.id), db.func.count(model.id))
+    ).one()
+    return f"{model.__tablename__}-{mx}-{cnt}"
+
+
+# Corpo serializado por ETag: misses repetidos com o mesmo etag nem refazem
+# o SELECT das linhas, só devolvem os bytes prontos.
+_etag_body_cache = LRUCache(maxsize=32)
+_etag_body_lock = threading.Lock()
+
+# Argon2id (vencedor do Password Hashing Competition): memory-hard, ao
+# contrário do bcrypt. Parâmetros seguindo a recomendação mínima do OWASP
+# (t=2, m=19 MiB, p=1), ~50 ms por hash em hardware comum.
+ph = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Pool para verificação de senha fora da thread da requisição. Threads bastam
+# (em vez de processos) porque o argon2-cffi libera o GIL durante o hash.
+_hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _):
+    """
+    Ajusta o SQLite em cada nova conexão:
+    - WAL permite leituras concorrentes com escritas (GETs não ficam
+      bloqueados atrás de POSTs);
+    - synchronous=NORMAL reduz o custo de fsync por commit (seguro com WAL);
+    - demais PRAGMAs reduzem I/O (cache/temp em memória, mmap do arquivo)
+      e ligam a checagem de chaves estrangeiras, desativada por padrão.
+    Só se aplica a conexões sqlite3 (outros bancos ignoram).
+    """
+    if not dbapi_conn.__class__.__module__.startswith("sqlite3"):
+        return
+    cur = dbapi_conn.cursor()
+    for pragma in (
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        "temp_store=MEMORY",
+        "cache_size=-20000",
+        "foreign_keys=ON",
+        "mmap_size=268435456",
+    ):
+        cur.execute(f"PRAGMA {pragma}")
+    cur.close()
+
+
+# =======================
+# PERFIS DE ACESSO
+# =======================
+class Role(IntFlag):
+    """
+    Perfis como bitmask: a autorização vira um AND inteiro sobre a claim
+    "r" do token, em vez de comparação de strings, e o token fica menor
+    (um dígito no lugar de "PROFISSIONAL").
+    """
+    ADMIN = 1
+    PROFISSIONAL = 2
+    PACIENTE = 4
+
+
+# =======================
+# MODELOS (tabelas)
+# =======================
+def _make_to_dict(fields, iso=()):
+    """
+    Gera um to_dict especializado para a classe via exec: o corpo vira um
+    literal de dict com chaves constantes, que o CPython compila em um único
+    opcode de construção de dict, em vez de inserir chave a chave. Os campos
+    ficam declarados uma única vez, junto ao modelo; campos em `iso` são
+    datetimes serializados com .isoformat().
+    """
+    body = ", ".join(
+        f"{f!r}: self.{f}.isoformat()" if f in iso else f"{f!r}: self.{f}"
+        for f in fields
+    )
+    namespace = {}
+    exec(f"def to_dict(self):\n    return {{{body}}}", namespace)
+    return namespace["to_dict"]
+
+
+class User(db.Model):
+    """
+    Usuário do sistema.
+    Representa autenticação e perfil de acesso (ADMIN, PROFISSIONAL, PACIENTE).
+    """
+    __tablename__ = "usuarios"
+
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    password_hash = db.Column(db.String(128), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # ADMIN, PROFISSIONAL, PACIENTE
+
+    to_dict = _make_to_dict(("id", "email", "role"))
+
+
+class Patient(db.Model):
+    """
+    Paciente do sistema: dados básicos necessários para atendimento.
+    """
+    __tablename__ = "pacientes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(120), nullable=False)
+    cpf = db.Column(db.String(14), unique=True, nullable=False)
+    data_nascimento = db.Column(db.String(10), nullable=True)
+    telefone = db.Column(db.String(20), nullable=True)
+
+    to_dict = _make_to_dict(("id", "nome", "cpf", "data_nascimento", "telefone"))
+
+
+class Professional(db.Model):
+    """
+    Profissional de saúde: médico, enfermeiro, etc.
+    """
+    __tablename__ = "profissionais"
+
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(120), nullable=False)
+    especialidade = db.Column(db.String(80), nullable=True)
+
+    to_dict = _make_to_dict(("id", "nome", "especialidade"))
+
+
+class Consultation(db.Model):
+    """
+    Consulta entre paciente e profissional.
+    Pode ser presencial ou teleconsulta.
+    """
+    __tablename__ = "consultas"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # SQLite não indexa FKs automaticamente; sem índice os filtros de
+    # listar_consultas viram varredura completa da tabela.
+    paciente_id = db.Column(db.Integer, db.ForeignKey("pacientes.id"), nullable=False, index=True)
+    profissional_id = db.Column(db.Integer, db.ForeignKey("profissionais.id"), nullable=False, index=True)
+    # DateTime nativo + índice: range queries e ORDER BY comparam inteiros
+    # em vez de strings de 25 bytes; a API continua falando ISO-8601.
+    data_hora = db.Column(db.DateTime, nullable=False, index=True)
+    via = db.Column(db.String(20), nullable=False)  # presencial ou teleconsulta
+    status = db.Column(db.String(20), nullable=False, default="agendada")
+    motivo = db.Column(db.String(255), nullable=True)
+
+    # Índice composto para o filtro combinado paciente_id + profissional_id.
+    __table_args__ = (db.Index("ix_consulta_pac_prof", "paciente_id", "profissional_id"),)
+
+    # lazy="selectin": ao listar N consultas, os relacionamentos vêm em uma
+    # única query "WHERE id IN (...)" por tabela, em vez de N queries (N+1).
+    paciente = db.relationship("Patient", backref="consultas", lazy="selectin")
+    profissional = db.relationship("Professional", backref="consultas", lazy="selectin")
+
+    to_dict = _make_to_dict(
+        ("id", "paciente_id", "profissional_id", "data_hora", "via", "status", "motivo"),
+        iso=("data_hora",),
+    )
+
+
+# =======================
+# AUTENTICAÇÃO (JWT)
+# =======================
+# Codificação/decodificação HS256 feita à mão: a chave e o cabeçalho fixo
+# são computados uma única vez no import, em vez de o PyJWT reprocessar a
+# SECRET_KEY e remontar o contexto HMAC a cada chamada. O formato no fio é
+# idêntico ao do PyJWT (mesmo cabeçalho, base64url sem padding), e os erros
+# continuam sendo as exceções do PyJWT para manter o tratamento existente.
+_SECRET = app.config["SECRET_KEY"].encode()
+_JWT_HEADER_B64 = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _jwt_encode(payload: dict) -> str:
+    body = base64.urlsafe_b64encode(
+        json.dumps(payload, separators=(",", ":")).encode()
+    ).rstrip(b"=")
+    signing_input = _JWT_HEADER_B64 + b"." + body
+    signature = base64.urlsafe_b64encode(
+        hmac.new(_SECRET, signing_input, hashlib.sha256).digest()
+    ).rstrip(b"=")
+    return (signing_input + b"." + signature).decode("ascii")
+
+
+def _jwt_decode(token: str) -> dict:
+    try:
+        header_b64, body_b64, sig_b64 = token.split(".")
+        expected = hmac.new(
+            _SECRET, f"{header_b64}.{body_b64}".encode("ascii"), hashlib.sha256
+        ).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(sig_b64)):
+            raise jwt.InvalidSignatureError("Signature verification failed")
+        payload = json.loads(_b64url_decode(body_b64))
+    except jwt.InvalidSignatureError:
+        raise
+    except Exception:
+        raise jwt.DecodeError("Not enough segments")
+    if payload.get("exp", 0) <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return payload
+
+
+def create_token(user: User) -> str:
+    """
+    Gera um token JWT com expiração de 2 horas.
+    """
+    payload = {
+        "user_id": user.id,
+        "email": user.email,
+        "r": Role[user.role].value,
+        "exp": int(time.time()) + 2 * 60 * 60,
+    }
+    return _jwt_encode(payload)
+
+
+# Usuário autenticado "leve", montado direto das claims do token.
+# Evita consultar o banco a cada requisição só para reidratar email/role
+# que já estão no payload; rotas que precisarem da linha completa podem
+# chamar db.session.get(User, current_user.id) explicitamente.
+AuthUser = namedtuple("AuthUser", "id email role role_mask")
+
+# Cache de tokens já verificados: evita repetir o HMAC do jwt.decode e a
+# consulta ao banco a cada requisição com o mesmo token (tokens duram 2h).
+# Chave = SHA-256 do token (nunca o token em claro); valor = (claims, user, exp).
+# TTL curto para que revogações/alterações de usuário demorem no máximo 5s.
+_token_cache = TTLCache(maxsize=10000, ttl=5)
+_token_cache_lock = threading.Lock()
+
+
+def token_required(f):
+    """
+    Decorator para proteger rotas que exigem autenticação.
+    Usa cabeçalho: Authorization: Bearer <token>.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth_header = request.headers.get("Authorization", None)
+        if not auth_header:
+            return jsonify({"message": "Token não enviado"}), 401
+
+        # Fatia direta em vez de .split(): sem alocar lista em cada requisição.
+        if len(auth_header) < 8 or auth_header[:7].lower() != "bearer ":
+            return jsonify({"message": "Cabeçalho Authorization inválido. Use: Bearer <token>"}), 401
+
+        token = auth_header[7:].strip()
+
+        token_hash = hashlib.sha256(token.encode()).digest()
+        with _token_cache_lock:
+            cached = _token_cache.get(token_hash)
+        if cached is not None:
+            data, current_user, exp = cached
+            if exp > time.time():
+                return f(current_user, *args, **kwargs)
+            return jsonify({"message": "Token expirado"}), 401
+
+        try:
+            data = _jwt_decode(token)
+        except jwt.ExpiredSignatureError:
+            return jsonify({"message": "Token expirado"}), 401
+        except Exception as e:
+            return jsonify({"message": "Token inválido", "error": str(e)}), 401
+
+        try:
+            role_mask = Role(data["r"])
+        except (KeyError, ValueError):
+            # Token antigo (claim "role" em string) ou perfil desconhecido.
+            return jsonify({"message": "Token inválido"}), 401
+        current_user = AuthUser(
+            id=data["user_id"], email=data["email"], role=role_mask.name, role_mask=role_mask
+        )
+
+        # Só armazena validações bem-sucedidas.
+        with _token_cache_lock:
+            _token_cache[token_hash] = (data, current_user, data["exp"])
+
+        return f(current_user, *args, **kwargs)
+    return decorated
+
+
+def require(mask: Role):
+    """
+    Decorator de autorização por perfil; usar abaixo de @token_required.
+    Exemplo: @require(Role.ADMIN | Role.PROFISSIONAL).
+    A checagem é um AND inteiro sobre a bitmask do token.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            if not current_user.role_mask & mask:
+                return jsonify({"message": "Acesso negado para este perfil"}), 403
+            return f(current_user, *args, **kwargs)
+        return decorated
+    return decorator
+
+
+# =======================
+# ROTAS DE AUTENTICAÇÃO
+# =======================
+@app.route("/auth/signup", methods=["POST"])
+def signup():
+    """
+    Cria um novo usuário do sistema.
+    Campos: email, password, role (opcional, padrão PACIENTE).
+    """
+    data = request.get_json(silent=True, cache=False) or {}
+    email = data.get("email")
+    password = data.get("password")
+    role = data.get("role", "PACIENTE")
+
+    if not email or not password:
+        return jsonify({"message": "email e password são obrigatórios"}), 400
+
+    if role not in Role.__members__:
+        return jsonify({"message": "role deve ser ADMIN, PROFISSIONAL ou PACIENTE"}), 400
+
+    if User.query.filter_by(email=email).first():
+        return jsonify({"message": "E-mail já cadastrado"}), 400
+
+    pw_hash = ph.hash(password)
+    user = User(email=email, password_hash=pw_hash, role=role)
+    _persist(user)
+
+    return jsonify({"message": "Usuário criado com sucesso", "user": user.to_dict()}), 201
+
+
+@app.route("/auth/login", methods=["POST"])
+async def login():
+    """
+    Realiza login de um usuário e devolve um token JWT.
+    """
+    data = request.get_json(silent=True, cache=False) or {}
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return jsonify({"message": "email e password são obrigatórios"}), 400
+
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        return jsonify({"message": "Credenciais inválidas"}), 401
+
+    # A verificação Argon2 (~50 ms, CPU-bound) roda no pool de threads em vez
+    # de prender o worker da requisição; o argon2-cffi libera o GIL durante o
+    # hash, então logins concorrentes escalam pelos núcleos da máquina.
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_hash_executor, ph.verify, user.password_hash, password)
+    except VerifyMismatchError:
+        return jsonify({"message": "Credenciais inválidas"}), 401
+    except Exception:
+        # Hash em formato desconhecido/corrompido: trata como credencial inválida.
+        return jsonify({"message": "Credenciais inválidas"}), 401
+
+    # Upgrade transparente: re-hash se os parâmetros do Argon2 mudarem.
+    if ph.check_needs_rehash(user.password_hash):
+        user.password_hash = ph.hash(password)
+        db.session.commit()
+
+    token = create_token(user)
+    return jsonify({"access_token": token, "user": user.to_dict()})
+
+
+# =======================
+# ROTAS DE PACIENTES
+# =======================
+# Validação de CPF com vetores de pesos pré-computados: os dois dígitos
+# verificadores saem de um multiply-sum sobre zip(digitos, pesos), sem laço
+# caractere a caractere nem ramificação por posição. Mantém CPFs inválidos
+# fora da query de unicidade e do banco.
+_CPF_NAO_DIGITOS = str.maketrans("", "", ".-/ ")
+_CPF_PESOS_1 = (10, 9, 8, 7, 6, 5, 4, 3, 2)
+_CPF_PESOS_2 = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+
+
+def _normalizar_cpf(cpf: str):
+    """
+    Remove a pontuação usual e valida os dígitos verificadores.
+    Retorna o CPF só com dígitos, ou None se inválido.
+    Aceita também CPF numérico no JSON (ex.: 11144477735).
+    """
+    digitos = str(cpf).translate(_CPF_NAO_DIGITOS)
+    if len(digitos) != 11 or not digitos.isdigit() or digitos == digitos[0] * 11:
+        return None
+    nums = tuple(map(int, digitos))
+    for pesos, dv in ((_CPF_PESOS_1, nums[9]), (_CPF_PESOS_2, nums[10])):
+        resto = sum(d * p for d, p in zip(nums, pesos)) % 11
+        if dv != (0 if resto < 2 else 11 - resto):
+            return None
+    return digitos
+
+
+@app.route("/pacientes", methods=["POST"])
+@token_required
+def criar_paciente(current_user: AuthUser):
+    """
+    Cria um novo paciente.
+    """
+    data = request.get_json(silent=True, cache=False) or {}
+    nome = data.get("nome")
+    cpf = data.get("cpf")
+
+    if not nome or not cpf:
+        return jsonify({"message": "nome e cpf são obrigatórios"}), 400
+
+    cpf = _normalizar_cpf(cpf)
+    if cpf is None:
+        return jsonify({"message": "CPF inválido"}), 400
+
+    if Patient.query.filter_by(cpf=cpf).first():
+        return jsonify({"message": "CPF já cadastrado"}), 400
+
+    paciente = Patient(
+        nome=nome,
+        cpf=cpf,
+        data_nascimento=data.get("data_nascimento"),
+        telefone=data.get("telefone"),
+    )
+    _persist(paciente)
+    return jsonify(paciente.to_dict()), 201
+
+
+@app.route("/pacientes/bulk", methods=["POST"])
+@token_required
+def criar_pacientes_bulk(current_user: AuthUser):
+    """
+    Cadastra vários pacientes de uma vez.
+    Corpo: lista de objetos {nome, cpf, data_nascimento?, telefone?}.
+    Usa insert em lote do Core (sem unit-of-work por linha) e um único
+    commit — um fsync para N pacientes.
+    """
+    data = request.get_json(silent=True, cache=False)
+    if not isinstance(data, list) or not data:
+        return jsonify({"message": "envie uma lista de pacientes"}), 400
+
+    registros = []
+    cpfs = set()
+    for item in data:
+        nome = item.get("nome") if isinstance(item, dict) else None
+        cpf = item.get("cpf") if isinstance(item, dict) else None
+        if not nome or not cpf:
+            return jsonify({"message": "nome e cpf são obrigatórios em todos os itens"}), 400
+        cpf = _normalizar_cpf(cpf)
+        if cpf is None:
+            return jsonify({"message": "CPF inválido na lista"}), 400
+        if cpf in cpfs:
+            return jsonify({"message": f"CPF repetido na lista: {cpf}"}), 400
+        cpfs.add(cpf)
+        registros.append({
+            "nome": nome,
+            "cpf": cpf,
+            "data_nascimento": item.get("data_nascimento"),
+            "telefone": item.get("telefone"),
+        })
+
+    existente = db.session.execute(
+        db.select(Patient.cpf).where(Patient.cpf.in_(cpfs))
+    ).scalars().first()
+    if existente:
+        return jsonify({"message": f"CPF já cadastrado: {existente}"}), 400
+
+    db.session.execute(db.insert(Patient), registros)
+    db.session.commit()
+    return jsonify({"message": "Pacientes criados com sucesso", "total": len(registros)}), 201
+
+
+@app.route("/pacientes", methods=["GET"])
+@token_required
+def listar_pacientes(current_user: AuthUser):
+    """
+    Lista todos os pacientes cadastrados.
+    """
+    etag = _table_etag(Patient)
+    if request.if_none_match.contains(etag):
+        return Response(status=304)
+
+    with _etag_body_lock:
+        body = _etag_body_cache.get(etag)
+    if body is None:
+        # Core select de colunas: evita materializar objetos ORM (identity
+        # map, instrumentação de atributos) só para serializar e descartar.
+        rows = db.session.execute(
+            db.select(Patient.id, Patient.nome, Patient.cpf, Patient.data_nascimento, Patient.telefone)
+        ).mappings().all()
+        body = orjson.dumps([dict(r) for r in rows])
+        with _etag_body_lock:
+            _etag_body_cache[etag] = body
+
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    return resp
+
+
+@app.route("/pacientes/<int:paciente_id>", methods=["GET"])
+@token_required
+def obter_paciente(current_user: AuthUser, paciente_id: int):
+    """
+    Retorna os dados de um paciente específico.
+    """
+    paciente = Patient.query.get_or_404(paciente_id)
+    return jsonify(paciente.to_dict())
+
+
+# =======================
+# ROTAS DE PROFISSIONAIS
+# =======================
+@app.route("/profissionais", methods=["POST"])
+@token_required
+def criar_profissional(current_user: AuthUser):
+    """
+    Cria um profissional de saúde.
+    """
+    data = request.get_json(silent=True, cache=False) or {}
+    nome = data.get("nome")
+    if not nome:
+        return jsonify({"message": "nome é obrigatório"}), 400
+
+    profissional = Professional(
+        nome=nome,
+        especialidade=data.get("especialidade"),
+    )
+    _persist(profissional)
+    return jsonify(profissional.to_dict()), 201
+
+
+@app.route("/profissionais", methods=["GET"])
+@token_required
+def listar_profissionais(current_user: AuthUser):
+    """
+    Lista todos os profissionais de saúde.
+    """
+    etag = _table_etag(Professional)
+    if request.if_none_match.contains(etag):
+        return Response(status=304)
+
+    with _etag_body_lock:
+        body = _etag_body_cache.get(etag)
+    if body is None:
+        rows = db.session.execute(
+            db.select(Professional.id, Professional.nome, Professional.especialidade)
+        ).mappings().all()
+        body = orjson.dumps([dict(r) for r in rows])
+        with _etag_body_lock:
+            _etag_body_cache[etag] = body
+
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    return resp
+
+
+# =======================
+# ROTAS DE CONSULTAS
+# =======================
+@app.route("/consultas", methods=["POST"])
+@token_required
+def criar_consulta(current_user: AuthUser):
+    """
+    Cria uma consulta (presencial ou teleconsulta) entre paciente e profissional.
+    """
+    data = request.get_json(silent=True, cache=False) or {}
+    paciente_id = data.get("paciente_id")
+    profissional_id = data.get("profissional_id")
+    data_hora = data.get("data_hora")
+    via = data.get("via")  # "presencial" ou "teleconsulta"
+
+    if not (paciente_id and profissional_id and data_hora and via):
+        return jsonify({"message": "paciente_id, profissional_id, data_hora e via são obrigatórios"}), 400
+
+    if via not in ["presencial", "teleconsulta"]:
+        return jsonify({"message": "via deve ser 'presencial' ou 'teleconsulta'"}), 400
+
+    try:
+        data_hora = datetime.datetime.fromisoformat(data_hora)
+    except (TypeError, ValueError):
+        return jsonify({"message": "data_hora deve estar em formato ISO, ex: 2025-01-25T14:00:00"}), 400
+
+    # Uma única ida ao banco para os dois EXISTS, em vez de duas queries
+    # que hidratariam objetos ORM descartados em seguida.
+    pac_exists, prof_exists = db.session.execute(
+        db.select(
+            db.exists().where(Patient.id == paciente_id).label("p"),
+            db.exists().where(Professional.id == profissional_id).label("d"),
+        )
+    ).one()
+    if not pac_exists:
+        return jsonify({"message": "Paciente não encontrado"}), 404
+    if not prof_exists:
+        return jsonify({"message": "Profissional não encontrado"}), 404
+
+    consulta = Consultation(
+        paciente_id=paciente_id,
+        profissional_id=profissional_id,
+        data_hora=data_hora,
+        via=via,
+        status=data.get("status", "agendada"),
+        motivo=data.get("motivo"),
+    )
+    _persist(consulta)
+    return jsonify(consulta.to_dict()), 201
+
+
+@app.route("/consultas", methods=["GET"])
+@token_required
+def listar_consultas(current_user: AuthUser):
+    """
+    Lista consultas; pode filtrar por paciente_id e profissional_id.
+    """
+    paciente_id = request.args.get("paciente_id")
+    profissional_id = request.args.get("profissional_id")
+
+    query = db.select(
+        Consultation.id,
+        Consultation.paciente_id,
+        Consultation.profissional_id,
+        Consultation.data_hora,
+        Consultation.via,
+        Consultation.status,
+        Consultation.motivo,
+    )
+    if paciente_id:
+        query = query.filter_by(paciente_id=paciente_id)
+    if profissional_id:
+        query = query.filter_by(profissional_id=profissional_id)
+
+    rows = db.session.execute(query).mappings().all()
+    return ojson([dict(r) for r in rows])
+
+
+# =======================
+# ROTA DE HEALTHCHECK
+# =======================
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Verifica se a API está respondendo.
+    """
+    return jsonify({"status": "ok", "message": "SGHSS mínimo rodando"}), 200
+
+
+def warmup():
+    """
+    Amortiza inicializações preguiçosas que senão cairiam na primeira
+    requisição real (~50-200 ms): primeira conexão do engine (incluindo os
+    PRAGMAs do SQLite), binding C do Argon2 e caminho de assinatura HMAC.
+    """
+    with app.app_context():
+        db.session.execute(db.text("SELECT 1")).scalar()
+    ph.hash("warmup")
+    _jwt_encode({"warmup": 1, "exp": 0})
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        db.create_all()
+    warmup()
+    # Servidor de desenvolvimento do Werkzeug: atende uma requisição por vez,
+    # então qualquer login segura todas as outras. Em produção, use o gunicorn
+    # via wsgi.py (ver README); debug só quando FLASK_ENV=dev (padrão local).
+    app.run(debug=os.environ.get("FLASK_ENV", "dev") == "dev")
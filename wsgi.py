@@ -0,0 +1,18 @@
+"""
+Ponto de entrada WSGI para produção.
+
+O servidor embutido do Flask (python app.py) é single-thread e serve só
+para desenvolvimento. Em produção, rode com workers + threads para que
+requisições concorrentes (inclusive logins, que custam ~50 ms de Argon2)
+não fiquem na fila umas das outras:
+
+    gunicorn -k gthread -w 4 --threads 8 wsgi:app
+
+Regra prática: -w = 2x núcleos; combine com o pool de conexões e o WAL
+já configurados em app.py para escalar as leituras com os núcleos.
+"""
+from app import app, db, warmup
+
+with app.app_context():
+    db.create_all()
+warmup()